@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
@@ -21,10 +23,11 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
             detail="Email already registered"
         )
     
-    # Create new user
+    # Create new user - hash in a worker thread, bcrypt blocks for ~100ms
+    password_hash = await asyncio.to_thread(get_password_hash, user_data.password)
     new_user = User(
         email=user_data.email,
-        password_hash=get_password_hash(user_data.password)
+        password_hash=password_hash
     )
     db.add(new_user)
     db.commit()
@@ -41,7 +44,12 @@ async def login(
     """Login and get access token."""
     # Find user by email
     user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+    # Run the bcrypt check in a worker thread so it doesn't stall the event loop
+    password_ok = (
+        await asyncio.to_thread(verify_password, form_data.password, user.password_hash)
+        if user else False
+    )
+    if not user or not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
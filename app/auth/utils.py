@@ -1,9 +1,12 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
+import hashlib
 import logging
+import threading
 
 import bcrypt
-from jose import JWTError, jwt
+import jwt
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
@@ -18,6 +21,19 @@ settings = get_settings()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Resolve signing constants once at import time instead of per call;
+# PyJWT accepts the secret as bytes directly
+_SECRET_KEY = settings.SECRET_KEY.encode()
+_ALGORITHM = settings.ALGORITHM
+_ALGORITHMS = [_ALGORITHM]
+_DEFAULT_EXPIRES_DELTA = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+
+# Cache of recently verified tokens so repeat requests skip the HMAC verify
+# and user SELECT. Keyed by a short token hash; TTL is kept well below token
+# lifetime so deleted users / stale data age out quickly.
+_token_cache: TTLCache = TTLCache(maxsize=10000, ttl=30)
+_token_cache_lock = threading.Lock()
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
@@ -37,12 +53,9 @@ def get_password_hash(password: str) -> str:
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.now(timezone.utc) + (expires_delta or _DEFAULT_EXPIRES_DELTA)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _SECRET_KEY, algorithm=_ALGORITHM)
     return encoded_jwt
 
 
@@ -56,16 +69,31 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cache_key = hashlib.sha256(token.encode()).hexdigest()[:32]
+    now = datetime.now(timezone.utc).timestamp()
+    with _token_cache_lock:
+        cached = _token_cache.get(cache_key)
+    if cached is not None:
+        exp, cached_user = cached
+        if exp is None or exp > now:
+            # Re-attach the cached user to the current session without a SELECT
+            return db.merge(cached_user, load=False)
+
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = jwt.decode(token, _SECRET_KEY, algorithms=_ALGORITHMS)
         user_id_str = payload.get("sub")
         if user_id_str is None:
             raise credentials_exception
         user_id = int(user_id_str)
-    except JWTError:
+    except jwt.InvalidTokenError:
         raise credentials_exception
-    
-    user = db.query(User).filter(User.id == user_id).first()
+
+    # Session.get checks the identity map before emitting a SELECT, so a
+    # second resolution within one request is free even on a cache miss
+    user = db.get(User, user_id)
     if user is None:
         raise credentials_exception
+
+    with _token_cache_lock:
+        _token_cache[cache_key] = (payload.get("exp"), user)
     return user
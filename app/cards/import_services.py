@@ -4,26 +4,42 @@ and text-based card generation.
 """
 import logging
 import io
+import json
 import zipfile
 import sqlite3
 import asyncio
 from typing import List, Dict, Optional
 from concurrent.futures import ThreadPoolExecutor
 
+import httpx
 from google import genai
 from google.genai import types
+from pydantic import BaseModel
 
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# Configure Gemini
-client = genai.Client(api_key=settings.GEMINI_API_KEY)
+# Configure Gemini - one client per process with a widened httpx pool so
+# concurrent calls reuse warm TLS connections instead of re-handshaking
+client = genai.Client(
+    api_key=settings.GEMINI_API_KEY,
+    http_options=types.HttpOptions(
+        timeout=120_000,  # ms
+        client_args={
+            "limits": httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        },
+    ),
+)
 
 # Thread pool for running sync Gemini calls
 _executor = ThreadPoolExecutor(max_workers=4)
 
+# Cap in-flight Gemini calls so bursts of uploads queue here instead of
+# piling up long-running requests (and 429s) at the API
+_gemini_sem = asyncio.Semaphore(4)
+
 
 def parse_csv_cards(cards_data: List[Dict[str, str]]) -> List[Dict[str, str]]:
     """
@@ -52,16 +68,26 @@ Rules:
 - Create clear, specific questions
 - Provide concise, accurate answers
 - Each card should test one concept
-- Format: question:answer (separated by colon)
-- One card per line
 
-Example format:
-What is the capital of France?:Paris
-Who wrote Romeo and Juliet?:William Shakespeare
-What is photosynthesis?:The process by which plants convert light energy into chemical energy
+Return a JSON array of objects, each with "question" and "answer" string fields.
 """
 
 
+class GeneratedCard(BaseModel):
+    """Schema Gemini is constrained to when generating cards as JSON."""
+    question: str
+    answer: str
+
+
+# Built once at import; constructing GenerateContentConfig re-validates the
+# config (and the response schema) every time otherwise
+_TEXT_GEN_CONFIG = types.GenerateContentConfig(
+    system_instruction=TEXT_GENERATION_PROMPT,
+    response_mime_type="application/json",
+    response_schema=list[GeneratedCard],
+)
+
+
 def _generate_cards_from_text_sync(text: str) -> Optional[str]:
     """
     Synchronous Gemini call for text generation (runs in thread pool).
@@ -70,7 +96,7 @@ def _generate_cards_from_text_sync(text: str) -> Optional[str]:
         logger.info("Generating cards from text using Gemini...")
         response = client.models.generate_content(
             model="gemini-2.0-flash",
-            config=types.GenerateContentConfig(system_instruction=TEXT_GENERATION_PROMPT),
+            config=_TEXT_GEN_CONFIG,
             contents=text
         )
         
@@ -99,34 +125,34 @@ async def generate_cards_from_text(text: str, timeout: float = 180.0) -> List[Di
         return []
     
     try:
-        loop = asyncio.get_event_loop()
-        response_text = await asyncio.wait_for(
-            loop.run_in_executor(_executor, _generate_cards_from_text_sync, text),
-            timeout=timeout
-        )
+        loop = asyncio.get_running_loop()
+        async with _gemini_sem:
+            response_text = await asyncio.wait_for(
+                loop.run_in_executor(_executor, _generate_cards_from_text_sync, text),
+                timeout=timeout
+            )
         
         if not response_text:
             return []
-        
-        # Remove markdown code blocks if present
-        if response_text.startswith("```"):
-            lines = response_text.split("\n")
-            response_text = "\n".join(lines[1:-1])
-        
-        # Parse response into cards
+
+        # JSON mode guarantees a JSON array; no markdown fences or colon-splitting
+        try:
+            raw_cards = json.loads(response_text)
+        except json.JSONDecodeError:
+            logger.warning("Gemini returned invalid JSON for card generation")
+            return []
+
         cards = []
-        for line in response_text.split("\n"):
-            if ":" in line:
-                parts = line.split(":", 1)
-                if len(parts) == 2:
-                    question = parts[0].strip()
-                    answer = parts[1].strip()
-                    if question and answer:
-                        cards.append({
-                            "question": question,
-                            "answer": answer
-                        })
-        
+        for item in raw_cards if isinstance(raw_cards, list) else []:
+            if isinstance(item, dict):
+                question = str(item.get("question", "")).strip()
+                answer = str(item.get("answer", "")).strip()
+                if question and answer:
+                    cards.append({
+                        "question": question,
+                        "answer": answer
+                    })
+
         logger.info(f"Generated {len(cards)} cards from text")
         return cards
         
@@ -138,44 +164,61 @@ async def generate_cards_from_text(text: str, timeout: float = 180.0) -> List[Di
         raise
 
 
+def _extract_pptx_text(pptx_bytes: bytes) -> str:
+    """
+    Parse a PPTX file and return the concatenated slide text.
+
+    Synchronous - python-pptx unpacks the whole OOXML zip, so this is meant
+    to run in a worker thread.
+    """
+    from pptx import Presentation
+
+    # Load presentation from bytes
+    pptx_file = io.BytesIO(pptx_bytes)
+    prs = Presentation(pptx_file)
+
+    # Extract text from all slides into a single buffer; has_text_frame is
+    # a cheap check that also skips picture/graphic shapes up front
+    buffer = io.StringIO()
+    total_slides = 0
+    for slide_num, slide in enumerate(prs.slides, 1):
+        total_slides = slide_num
+        slide_text = [
+            shape.text_frame.text
+            for shape in slide.shapes
+            if shape.has_text_frame and shape.text_frame.text
+        ]
+        if slide_text:
+            if buffer.tell():
+                buffer.write("\n\n")
+            buffer.write(f"Slide {slide_num}:\n")
+            buffer.write("\n".join(slide_text))
+
+    logger.info(f"Extracted text from {total_slides} slides")
+    return buffer.getvalue()
+
+
 async def extract_and_generate_from_pptx(pptx_bytes: bytes) -> List[Dict[str, str]]:
     """
     Extract text from PowerPoint file and generate flashcards.
-    
+
     Args:
         pptx_bytes: PowerPoint file content
-        
+
     Returns:
         List of card dictionaries
     """
     try:
-        from pptx import Presentation
-        
-        # Load presentation from bytes
-        pptx_file = io.BytesIO(pptx_bytes)
-        prs = Presentation(pptx_file)
-        
-        # Extract text from all slides
-        text_content = []
-        for slide_num, slide in enumerate(prs.slides, 1):
-            slide_text = []
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text:
-                    slide_text.append(shape.text)
-            
-            if slide_text:
-                text_content.append(f"Slide {slide_num}:\n" + "\n".join(slide_text))
-        
-        if not text_content:
+        # Parsing blocks on zip/XML work - keep it off the event loop
+        full_text = await asyncio.to_thread(_extract_pptx_text, pptx_bytes)
+
+        if not full_text:
             logger.warning("No text found in PowerPoint file")
             return []
-        
-        full_text = "\n\n".join(text_content)
-        logger.info(f"Extracted text from {len(prs.slides)} slides")
-        
+
         # Generate cards from extracted text
         return await generate_cards_from_text(full_text)
-        
+
     except ImportError:
         logger.error("python-pptx not installed")
         raise Exception("PowerPoint support not available. Please install python-pptx.")
@@ -204,13 +247,12 @@ def parse_anki_package(apkg_bytes: bytes) -> Dict[str, List[Dict[str, str]]]:
                 raise ValueError("Invalid Anki package: collection.anki2 not found")
             
             db_bytes = zip_ref.read('collection.anki2')
-            
-        # Write to temporary file for SQLite
-        db_file = io.BytesIO(db_bytes)
-        
-        # Connect to SQLite database
+
+        # collection.anki2 is a binary SQLite file - load it directly into an
+        # in-memory database (Python 3.11+) instead of going through disk
         conn = sqlite3.connect(':memory:')
-        conn.executescript(db_bytes.decode('utf-8', errors='ignore'))
+        conn.deserialize(db_bytes)
+        conn.execute("PRAGMA query_only = 1")
         cursor = conn.cursor()
         
         # Query decks and cards
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, CheckConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, CheckConstraint, Index, select
+from sqlalchemy.orm import column_property, relationship
 from sqlalchemy.sql import func
 from datetime import datetime, timedelta
 
@@ -8,7 +8,11 @@ from app.database import Base
 
 class Deck(Base):
     __tablename__ = "decks"
-    
+    __table_args__ = (
+        # Deck list is always filtered by owner and sorted by creation date
+        Index("ix_decks_user_created", "user_id", "created_at"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -40,7 +44,14 @@ class Folder(Base):
 
 class Card(Base):
     __tablename__ = "cards"
-    
+    __table_args__ = (
+        # Card queries filter on owner (optionally deck) and sort by created_at
+        Index("ix_cards_user_deck_created", "user_id", "deck_id", "created_at"),
+        Index("ix_cards_user_created", "user_id", "created_at"),
+        # Deck export and the card_count subquery filter by deck_id alone
+        Index("ix_cards_deck_created", "deck_id", "created_at"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
@@ -48,19 +59,46 @@ class Card(Base):
     deck_id = Column(Integer, ForeignKey("decks.id", ondelete="CASCADE"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
-    
+    # Stamped by the first review submit; NULL means "new card", which lets
+    # the study picker filter directly instead of anti-joining card_reviews
+    first_reviewed_at = Column(DateTime(timezone=True), nullable=True)
+
     # Relationships
     owner = relationship("User", back_populates="cards")
     deck = relationship("Deck", back_populates="cards")
     reviews = relationship("CardReview", back_populates="card", cascade="all, delete-orphan")
 
 
+# Card count fetched in the same SELECT as the deck row (indexed aggregate).
+# Deferred so endpoints that don't need it never pay for the subquery.
+Deck.card_count = column_property(
+    select(func.count(Card.id))
+    .where(Card.deck_id == Deck.id)
+    .correlate_except(Card)
+    .scalar_subquery(),
+    deferred=True,
+)
+
+
+# SM-2 ease-factor adjustment only depends on quality (0-5), so precompute
+# the six possible deltas once instead of redoing the float math per review
+_EASE_DELTA = {q: 0.1 - (5 - q) * (0.08 + (5 - q) * 0.02) for q in range(6)}
+
+
 class CardReview(Base):
     """
     Tracks spaced repetition data for cards using the SM-2 algorithm.
     """
     __tablename__ = "card_reviews"
-    
+    __table_args__ = (
+        # One review row per card and user; the submit endpoints upsert
+        # against this via ON CONFLICT
+        Index("ux_card_reviews_card_user", "card_id", "user_id", unique=True),
+        # Study queries scan a user's reviews by due date / review time
+        Index("ix_card_reviews_user_due", "user_id", "due_date"),
+        Index("ix_card_reviews_user_lastrev", "user_id", "last_reviewed"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     card_id = Column(Integer, ForeignKey("cards.id", ondelete="CASCADE"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -97,8 +135,8 @@ class CardReview(Base):
         Returns:
             tuple of (new_ease_factor, new_interval_days, new_repetitions, new_due_date)
         """
-        # Update ease factor
-        new_ease = self.ease_factor + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        # Update ease factor using the precomputed per-quality delta
+        new_ease = self.ease_factor + _EASE_DELTA[quality]
         new_ease = max(1.3, new_ease)  # Minimum ease factor is 1.3
         
         # Calculate new interval
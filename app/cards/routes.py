@@ -1,8 +1,15 @@
+import asyncio
+import re
+import threading
+from functools import lru_cache
 from typing import List, Optional, Dict
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Form, Body
-from fastapi.responses import PlainTextResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func as sql_func
+from urllib.parse import quote
+
+from cachetools import TTLCache
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, UploadFile, File, Query, Form, Body
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy.orm import Session, raiseload, undefer
+from sqlalchemy import bindparam, func as sql_func, delete, insert, lambda_stmt, select, update
 from pydantic import BaseModel
 
 from app.database import get_db
@@ -24,20 +31,153 @@ router = APIRouter(prefix="/cards", tags=["Cards"])
 MAX_FILE_SIZE_MB = 100
 MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
 
+# Short-lived per-user cache for the hot list endpoints. Keys are
+# ("decks", user_id) / ("cards", user_id, deck_id); every mutating endpoint
+# below drops the user's entries so reads between writes skip the DB.
+_list_cache: TTLCache = TTLCache(maxsize=2048, ttl=30)
+_list_cache_lock = threading.Lock()
+
+# Ownership lookup used by the single-card endpoints. lambda_stmt caches the
+# compiled SQL keyed by the lambda, so per-request calls skip AST construction
+# and statement compilation entirely.
+_GET_CARD_STMT = lambda_stmt(
+    lambda: select(Card).where(Card.id == bindparam("cid"), Card.user_id == bindparam("uid"))
+)
+
+
+def get_owned_card(
+    card_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Card:
+    """Dependency: fetch a card owned by the current user or raise 404."""
+    card = db.execute(_GET_CARD_STMT, {"cid": card_id, "uid": current_user.id}).scalar_one_or_none()
+    if not card:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Card not found"
+        )
+    return card
+
+
+def _list_cache_get(key):
+    with _list_cache_lock:
+        return _list_cache.get(key)
+
+
+def _list_cache_set(key, value) -> None:
+    with _list_cache_lock:
+        _list_cache[key] = value
+
+
+def invalidate_list_cache(user_id: int) -> None:
+    """Drop cached list responses for a user after any card/deck write."""
+    with _list_cache_lock:
+        for key in [k for k in _list_cache if k[1] == user_id]:
+            del _list_cache[key]
+
+
+def _deck_to_dict(deck: Deck) -> dict:
+    """Serialize a deck row (with loaded card_count) for ORJSONResponse."""
+    return {
+        "id": deck.id,
+        "name": deck.name,
+        "user_id": deck.user_id,
+        "folder_id": deck.folder_id,
+        "created_at": deck.created_at,
+        "card_count": deck.card_count,
+    }
+
+
+def _card_to_dict(card: Card) -> dict:
+    """Serialize a card row for ORJSONResponse."""
+    return {
+        "id": card.id,
+        "question": card.question,
+        "answer": card.answer,
+        "user_id": card.user_id,
+        "deck_id": card.deck_id,
+        "created_at": card.created_at,
+        "updated_at": card.updated_at,
+    }
+
+
+# Translation table for export escaping, built once at import. Backslashes
+# must be escaped too or exported cards with "\;" can't round-trip, and
+# embedded newlines would otherwise split a card across export lines.
+_EXPORT_ESCAPE = str.maketrans({";": "\\;", "\\": "\\\\", "\n": "\\n", "\r": ""})
+
 
 def escape_csv_field(text: str) -> str:
-    """Escape semicolons in text for CSV export."""
-    return text.replace(";", "\\;")
+    """Escape semicolons, backslashes and newlines in text for CSV export."""
+    return text.translate(_EXPORT_ESCAPE)
+
+
+def bulk_insert_cards(db: Session, user_id: int, deck_id: int, cards_data: List[Dict[str, str]]) -> List[Card]:
+    """Insert generated cards with a single executemany INSERT, then fetch
+    them back in one SELECT instead of one refresh round-trip per card."""
+    db.execute(
+        insert(Card),
+        [
+            {
+                "question": card_data["question"],
+                "answer": card_data["answer"],
+                "user_id": user_id,
+                "deck_id": deck_id,
+            }
+            for card_data in cards_data
+        ],
+    )
+    db.commit()
+    invalidate_list_cache(user_id)
+    return db.query(Card).filter(Card.deck_id == deck_id).order_by(Card.id).all()
+
+
+async def read_upload_limited(file: UploadFile) -> bytes:
+    """Read an upload in 64KB chunks, rejecting oversized files as soon as
+    the limit is crossed instead of buffering the whole body first."""
+    # Trust-but-verify: a declared size over the limit fails before any
+    # bytes are read; the chunked loop still enforces it on the real body
+    if file.size is not None and file.size > MAX_FILE_SIZE_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size is {MAX_FILE_SIZE_MB}MB"
+        )
+    size = 0
+    chunks = []
+    while chunk := await file.read(65536):
+        size += len(chunk)
+        if size > MAX_FILE_SIZE_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File too large. Maximum size is {MAX_FILE_SIZE_MB}MB"
+            )
+        chunks.append(chunk)
+    return b"".join(chunks)
 
 
-def format_cards_for_export(cards: List[Card]) -> str:
-    """Format cards as semicolon-separated text."""
-    lines = []
-    for card in cards:
-        question = escape_csv_field(card.question)
-        answer = escape_csv_field(card.answer)
-        lines.append(f"{question};{answer}")
-    return "\n".join(lines)
+# Content-Disposition template built once; only the quoted name varies
+_CD_TEMPLATE = "attachment; filename*=UTF-8''%s_cards.txt"
+
+# Upload "pages" form field: comma-separated 0-based page indices; anything
+# that isn't digits is ignored rather than rejected
+_PAGES_RE = re.compile(r"\d+")
+
+
+@lru_cache(maxsize=1024)
+def _safe_deck_filename(name: str) -> str:
+    """URL-encode a deck name for the export Content-Disposition header."""
+    return quote(name.replace(' ', '_'), safe='')
+
+
+def iter_export_lines(rows):
+    """Yield one encoded export line per (question, answer) row so export
+    responses stream instead of being joined into one in-memory string."""
+    first = True
+    for question, answer in rows:
+        line = f"{escape_csv_field(question)};{escape_csv_field(answer)}"
+        yield (line if first else "\n" + line).encode()
+        first = False
 
 
 # ============== DECK ENDPOINTS ==============
@@ -48,34 +188,28 @@ async def get_decks(
     current_user: User = Depends(get_current_user)
 ):
     """Get all decks for the current user."""
-    # Optimized query with card count subquery to avoid N+1
-    card_count_subq = (
-        db.query(Card.deck_id, sql_func.count(Card.id).label("card_count"))
-        .group_by(Card.deck_id)
-        .subquery()
-    )
-    
-    decks_with_counts = (
-        db.query(Deck, sql_func.coalesce(card_count_subq.c.card_count, 0).label("card_count"))
-        .outerjoin(card_count_subq, Deck.id == card_count_subq.c.deck_id)
+    cache_key = ("decks", current_user.id)
+    cached = _list_cache_get(cache_key)
+    if cached is not None:
+        return ORJSONResponse(cached)
+
+    # card_count is a deferred column_property; undefer pulls it in the
+    # same SELECT as the deck rows, so this stays a single round-trip
+    decks = (
+        db.query(Deck)
+        # raiseload turns any accidental lazy-load during serialization
+        # into a loud error instead of a hidden per-row SELECT
+        .options(undefer(Deck.card_count), raiseload('*'))
         .filter(Deck.user_id == current_user.id)
         .order_by(Deck.created_at.desc())
         .all()
     )
-    
-    result = []
-    for deck, card_count in decks_with_counts:
-        deck_dict = {
-            "id": deck.id,
-            "name": deck.name,
-            "user_id": deck.user_id,
-            "folder_id": deck.folder_id,
-            "created_at": deck.created_at,
-            "card_count": card_count
-        }
-        result.append(deck_dict)
-    
-    return result
+    result = [_deck_to_dict(deck) for deck in decks]
+
+    _list_cache_set(cache_key, result)
+    # Returning a Response directly skips the response_model revalidation
+    # pass; orjson serializes the dicts (datetimes included) in C
+    return ORJSONResponse(result)
 
 
 @router.delete("/decks/{deck_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -85,15 +219,20 @@ async def delete_deck(
     current_user: User = Depends(get_current_user)
 ):
     """Delete a deck and all its cards."""
-    deck = db.query(Deck).filter(Deck.id == deck_id, Deck.user_id == current_user.id).first()
-    if not deck:
+    # Single authorized DELETE; cards go via the DB-level ON DELETE CASCADE
+    # instead of the ORM loading every card just to delete it
+    result = db.execute(
+        delete(Deck)
+        .where(Deck.id == deck_id, Deck.user_id == current_user.id)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    invalidate_list_cache(current_user.id)
+    if result.rowcount == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Deck not found"
         )
-    
-    db.delete(deck)
-    db.commit()
     return None
 
 
@@ -105,27 +244,47 @@ async def update_deck(
     current_user: User = Depends(get_current_user)
 ):
     """Update a deck (name or folder)."""
-    deck = db.query(Deck).filter(Deck.id == deck_id, Deck.user_id == current_user.id).first()
-    if not deck:
-        raise HTTPException(status_code=404, detail="Deck not found")
-    
+    values = {}
     if deck_update.folder_id is not None:
         # Verify folder exists and belongs to user
         if deck_update.folder_id > 0:
-            folder = db.query(Folder).filter(Folder.id == deck_update.folder_id, Folder.user_id == current_user.id).first()
-            if not folder:
-                 raise HTTPException(status_code=404, detail="Folder not found")
-            deck.folder_id = deck_update.folder_id
+            folder_id = db.execute(
+                select(Folder.id).where(Folder.id == deck_update.folder_id, Folder.user_id == current_user.id)
+            ).scalar_one_or_none()
+            if folder_id is None:
+                raise HTTPException(status_code=404, detail="Folder not found")
+            values["folder_id"] = deck_update.folder_id
         else:
             # If 0 (or negative), remove from folder
-            deck.folder_id = None
-            
+            values["folder_id"] = None
+
     if deck_update.name is not None:
-        deck.name = deck_update.name
-    
-    db.commit()
-    db.refresh(deck)
-    return deck
+        values["name"] = deck_update.name
+
+    deck_cols = (Deck.id, Deck.name, Deck.user_id, Deck.folder_id, Deck.created_at)
+    if values:
+        # Single authorized UPDATE ... RETURNING instead of SELECT + UPDATE
+        # + refresh; rowless result doubles as the ownership check
+        row = db.execute(
+            update(Deck)
+            .where(Deck.id == deck_id, Deck.user_id == current_user.id)
+            .values(**values)
+            .returning(*deck_cols)
+            .execution_options(synchronize_session=False)
+        ).first()
+        db.commit()
+        invalidate_list_cache(current_user.id)
+    else:
+        row = db.execute(
+            select(*deck_cols).where(Deck.id == deck_id, Deck.user_id == current_user.id)
+        ).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Deck not found")
+
+    card_count = db.execute(
+        select(sql_func.count(Card.id)).where(Card.deck_id == deck_id)
+    ).scalar_one()
+    return ORJSONResponse({**row._mapping, "card_count": card_count})
 
 # ============== FOLDER ENDPOINTS ==============
 
@@ -223,6 +382,7 @@ async def delete_folder(
     
     db.delete(folder)
     db.commit()
+    invalidate_list_cache(current_user.id)
     return None
 
 
@@ -233,29 +393,27 @@ async def export_deck(
     current_user: User = Depends(get_current_user)
 ):
     """Export all cards from a deck as semicolon-separated text file."""
-    from urllib.parse import quote
-    
-    deck = db.query(Deck).filter(Deck.id == deck_id, Deck.user_id == current_user.id).first()
-    if not deck:
+    # Only the name is needed for the filename; skip hydrating the Deck row
+    deck_name = db.execute(
+        select(Deck.name).where(Deck.id == deck_id, Deck.user_id == current_user.id)
+    ).scalar_one_or_none()
+    if deck_name is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Deck not found"
         )
     
-    cards = db.query(Card).filter(Card.deck_id == deck_id).order_by(Card.created_at.desc()).all()
-    
-    if not cards:
-        return PlainTextResponse(content="", media_type="text/plain")
-    
-    content = format_cards_for_export(cards)
-    # Use URL encoding for non-ASCII characters in filename
-    safe_name = quote(deck.name.replace(' ', '_'), safe='')
-    filename = f"{safe_name}_cards.txt"
-    
-    return PlainTextResponse(
-        content=content,
+    rows = db.execute(
+        select(Card.question, Card.answer)
+        .where(Card.deck_id == deck_id)
+        .order_by(Card.created_at.desc())
+        .execution_options(yield_per=1000)
+    )
+
+    return StreamingResponse(
+        iter_export_lines(rows),
         media_type="text/plain",
-        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{filename}"}
+        headers={"Content-Disposition": _CD_TEMPLATE % _safe_deck_filename(deck_name)}
     )
 
 
@@ -275,30 +433,27 @@ async def upload_pdf(
     - **file**: The PDF file
     - **pages**: Optional, comma-separated list of 0-based page indices to process (e.g., "0,1,3")
     """
-    if not file.filename.lower().endswith('.pdf'):
+    # Only lowercase the extension, not the whole filename
+    if file.filename.rpartition('.')[2].lower() != 'pdf':
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Only PDF files are allowed"
         )
-    
-    # Read PDF content
-    pdf_bytes = await file.read()
-
-    # Parse selected pages
-    selected_page_indices = None
-    if pages:
-        try:
-            # pages comes as "1,2,3" string from frontend
-            # Assuming frontend sends 1-based or 0-based? Let's assume 1-based keys from UI, or convert.
-            # Usually UI displays 1-based, but internally we might want 0-based for fitz.
-            # Let's standardize: Frontend sends comma-separated integers. 
-            # If the user sees "Page 1", we treat it as index 0.
-            # Let's assume the frontend sends 0-BASED INDICES for simplicity in backend logic, 
-            # OR we decode here.
-            # Let's assume frontend sends 0-based indices.
-            selected_page_indices = [int(p.strip()) for p in pages.split(",") if p.strip().isdigit()]
-        except ValueError:
-            pass # Ignore invalid format and process all pages
+    # Reject mismatched MIME types before reading any bytes (octet-stream is
+    # allowed because some browsers send it for drag-and-dropped files)
+    if file.content_type not in (None, 'application/pdf', 'application/x-pdf', 'application/octet-stream'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only PDF files are allowed"
+        )
+
+    # Read PDF content with an early size check
+    pdf_bytes = await read_upload_limited(file)
+
+    # Parse selected pages (frontend sends 0-based indices). The regex scan
+    # tolerates stray whitespace/garbage in one pass, and sorted-dedup keeps
+    # the excerpt in document order for filter_pdf_pages
+    selected_page_indices = sorted(set(map(int, _PAGES_RE.findall(pages)))) if pages else None
     
     # Validate file size
     if len(pdf_bytes) == 0:
@@ -306,15 +461,16 @@ async def upload_pdf(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Empty file uploaded"
         )
-    
-    if len(pdf_bytes) > MAX_FILE_SIZE_BYTES:
+
+    # Fail fast on misnamed files before fitz allocates parser state
+    if not pdf_bytes.startswith(b'%PDF-'):
         raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File too large. Maximum size is {MAX_FILE_SIZE_MB}MB"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File is not a valid PDF"
         )
     
     # Create deck with PDF filename
-    deck_name = file.filename.rsplit('.', 1)[0]  # Remove .pdf extension
+    deck_name = file.filename[:-4]  # Remove .pdf extension
     deck = Deck(name=deck_name, user_id=current_user.id)
     db.add(deck)
     db.flush()  # Get deck ID without committing
@@ -336,74 +492,65 @@ async def upload_pdf(
             detail="Could not generate cards from the PDF. The file might be empty or contain unsupported content."
         )
     
-    # Save cards to database
-    created_cards = []
-    for card_data in generated_cards:
-        card = Card(
-            question=card_data["question"],
-            answer=card_data["answer"],
-            user_id=current_user.id,
-            deck_id=deck.id
-        )
-        db.add(card)
-        created_cards.append(card)
-    
-    db.commit()
-    
-    # Refresh to get IDs and timestamps
-    for card in created_cards:
-        db.refresh(card)
-    
+    # Save cards to database in one bulk INSERT
+    created_cards = bulk_insert_cards(db, current_user.id, deck.id, generated_cards)
+
     return created_cards
 
 
 @router.get("/", response_model=List[CardResponse])
 async def get_cards(
     deck_id: Optional[int] = Query(None, description="Filter by deck ID"),
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get all cards for the current user, optionally filtered by deck."""
-    query = db.query(Card).filter(Card.user_id == current_user.id)
-    
+    # Cheap index-only scan: count + newest updated_at identify the list
+    # state, so unchanged pollers get a bodyless 304 instead of the payload
+    etag_stmt = select(sql_func.count(Card.id), sql_func.max(Card.updated_at)).where(
+        Card.user_id == current_user.id
+    )
+    if deck_id is not None:
+        etag_stmt = etag_stmt.where(Card.deck_id == deck_id)
+    count, max_updated = db.execute(etag_stmt).one()
+    etag = f'W/"{count}-{max_updated.timestamp() if max_updated else 0}"'
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    cache_key = ("cards", current_user.id, deck_id)
+    cached = _list_cache_get(cache_key)
+    if cached is not None:
+        return ORJSONResponse(cached, headers={"ETag": etag})
+
+    query = db.query(Card).options(raiseload('*')).filter(Card.user_id == current_user.id)
+
     if deck_id is not None:
         query = query.filter(Card.deck_id == deck_id)
-    
+
     cards = query.order_by(Card.created_at.desc()).all()
-    return cards
+    result = [_card_to_dict(card) for card in cards]
+    _list_cache_set(cache_key, result)
+    return ORJSONResponse(result, headers={"ETag": etag})
 
 
 @router.get("/{card_id}", response_model=CardResponse)
 async def get_card(
-    card_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    card: Card = Depends(get_owned_card)
 ):
     """Get a specific card by ID."""
-    card = db.query(Card).filter(Card.id == card_id, Card.user_id == current_user.id).first()
-    if not card:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Card not found"
-        )
-    return card
+    # The row came straight from our own query; skip the Pydantic
+    # revalidation pass and serialize the dict directly
+    return ORJSONResponse(_card_to_dict(card))
 
 
 @router.put("/{card_id}", response_model=CardResponse)
 async def update_card(
-    card_id: int,
     card_update: CardUpdate,
+    card: Card = Depends(get_owned_card),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
 ):
     """Update a card."""
-    card = db.query(Card).filter(Card.id == card_id, Card.user_id == current_user.id).first()
-    if not card:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Card not found"
-        )
-    
     if card_update.question is not None:
         card.question = card_update.question
     if card_update.answer is not None:
@@ -411,7 +558,8 @@ async def update_card(
     
     db.commit()
     db.refresh(card)
-    return card
+    invalidate_list_cache(card.user_id)
+    return ORJSONResponse(_card_to_dict(card))
 
 
 @router.delete("/{card_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -421,15 +569,18 @@ async def delete_card(
     current_user: User = Depends(get_current_user)
 ):
     """Delete a card."""
-    card = db.query(Card).filter(Card.id == card_id, Card.user_id == current_user.id).first()
-    if not card:
+    result = db.execute(
+        delete(Card)
+        .where(Card.id == card_id, Card.user_id == current_user.id)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    invalidate_list_cache(current_user.id)
+    if result.rowcount == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Card not found"
         )
-    
-    db.delete(card)
-    db.commit()
     return None
 
 
@@ -439,15 +590,15 @@ async def export_cards(
     current_user: User = Depends(get_current_user)
 ):
     """Export all cards as semicolon-separated text file."""
-    cards = db.query(Card).filter(Card.user_id == current_user.id).order_by(Card.created_at.desc()).all()
-    
-    if not cards:
-        return PlainTextResponse(content="", media_type="text/plain")
-    
-    content = format_cards_for_export(cards)
-    
-    return PlainTextResponse(
-        content=content,
+    rows = db.execute(
+        select(Card.question, Card.answer)
+        .where(Card.user_id == current_user.id)
+        .order_by(Card.created_at.desc())
+        .execution_options(yield_per=1000)
+    )
+
+    return StreamingResponse(
+        iter_export_lines(rows),
         media_type="text/plain",
         headers={"Content-Disposition": "attachment; filename=anki_cards.txt"}
     )
@@ -486,6 +637,7 @@ async def create_deck(
     db.add(db_deck)
     db.commit()
     db.refresh(db_deck)
+    invalidate_list_cache(current_user.id)
     
     # Return with card_count = 0
     return {
@@ -527,24 +679,9 @@ async def import_csv(
     db.add(deck)
     db.flush()
     
-    # Create cards
-    created_cards = []
-    for card_data in parsed_cards:
-        card = Card(
-            question=card_data["question"],
-            answer=card_data["answer"],
-            user_id=current_user.id,
-            deck_id=deck.id
-        )
-        db.add(card)
-        created_cards.append(card)
-    
-    db.commit()
-    
-    # Refresh to get IDs
-    for card in created_cards:
-        db.refresh(card)
-    
+    # Create cards in one bulk INSERT
+    created_cards = bulk_insert_cards(db, current_user.id, deck.id, parsed_cards)
+
     return created_cards
 
 
@@ -583,23 +720,9 @@ async def generate_from_text(
     db.add(deck)
     db.flush()
     
-    # Save cards
-    created_cards = []
-    for card_data in generated_cards:
-        card = Card(
-            question=card_data["question"],
-            answer=card_data["answer"],
-            user_id=current_user.id,
-            deck_id=deck.id
-        )
-        db.add(card)
-        created_cards.append(card)
-    
-    db.commit()
-    
-    for card in created_cards:
-        db.refresh(card)
-    
+    # Save cards in one bulk INSERT
+    created_cards = bulk_insert_cards(db, current_user.id, deck.id, generated_cards)
+
     return created_cards
 
 
@@ -619,19 +742,20 @@ async def import_pptx(
             detail="Only PowerPoint files (.pptx, .ppt) are allowed"
         )
     
-    # Read file content
-    pptx_bytes = await file.read()
+    # Read file content with an early size check
+    pptx_bytes = await read_upload_limited(file)
     
     if len(pptx_bytes) == 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Empty file uploaded"
         )
-    
-    if len(pptx_bytes) > MAX_FILE_SIZE_BYTES:
+
+    # .pptx is an OOXML zip; check the magic before python-pptx unpacks it
+    if not pptx_bytes.startswith(b'PK\x03\x04'):
         raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File too large. Maximum size is {MAX_FILE_SIZE_MB}MB"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File is not a valid PowerPoint file"
         )
     
     # Extract and generate cards
@@ -654,23 +778,9 @@ async def import_pptx(
     db.add(deck)
     db.flush()
     
-    # Save cards
-    created_cards = []
-    for card_data in generated_cards:
-        card = Card(
-            question=card_data["question"],
-            answer=card_data["answer"],
-            user_id=current_user.id,
-            deck_id=deck.id
-        )
-        db.add(card)
-        created_cards.append(card)
-    
-    db.commit()
-    
-    for card in created_cards:
-        db.refresh(card)
-    
+    # Save cards in one bulk INSERT
+    created_cards = bulk_insert_cards(db, current_user.id, deck.id, generated_cards)
+
     return created_cards
 
 
@@ -691,18 +801,27 @@ async def import_anki(
             detail="Only Anki .apkg files are allowed"
         )
     
-    # Read file
-    apkg_bytes = await file.read()
+    # Read file with an early size check
+    apkg_bytes = await read_upload_limited(file)
     
     if len(apkg_bytes) == 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Empty file uploaded"
         )
+
+    # .apkg is a zip archive; check the magic before unzipping
+    if not apkg_bytes.startswith(b'PK\x03\x04'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File is not a valid Anki package"
+        )
     
     # Parse Anki package
     try:
-        decks_data = parse_anki_package(apkg_bytes)
+        # sqlite deserialize + zip extraction are sync CPU work; keep them
+        # off the event loop so parallel uploads stay concurrent
+        decks_data = await asyncio.to_thread(parse_anki_package, apkg_bytes)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
@@ -715,32 +834,39 @@ async def import_anki(
             detail="No decks found in Anki package"
         )
     
-    # Import all decks
-    all_created_cards = []
-    
-    for deck_name, cards_data in decks_data.items():
-        # Create deck
-        deck = Deck(name=deck_name, user_id=current_user.id)
-        db.add(deck)
-        db.flush()
-        
-        # Create cards
-        for card_data in cards_data:
-            card = Card(
-                question=card_data["question"],
-                answer=card_data["answer"],
-                user_id=current_user.id,
-                deck_id=deck.id
-            )
-            db.add(card)
-            all_created_cards.append(card)
-    
+    # Bulk-create all decks in one INSERT ... RETURNING; names are unique
+    # within the package (dict keys), so they key the returned ids
+    deck_rows = db.execute(
+        insert(Deck).returning(Deck.id, Deck.name),
+        [{"name": deck_name, "user_id": current_user.id} for deck_name in decks_data],
+    ).all()
+    deck_id_by_name = {name: deck_id for deck_id, name in deck_rows}
+
+    # Flatten every deck's cards into a single executemany INSERT
+    db.execute(
+        insert(Card),
+        [
+            {
+                "question": card_data["question"],
+                "answer": card_data["answer"],
+                "user_id": current_user.id,
+                "deck_id": deck_id_by_name[deck_name],
+            }
+            for deck_name, cards_data in decks_data.items()
+            for card_data in cards_data
+        ],
+    )
     db.commit()
-    
-    for card in all_created_cards:
-        db.refresh(card)
-    
-    return all_created_cards
+    invalidate_list_cache(current_user.id)
+
+    # Re-select everything in one query instead of one refresh per card
+    return (
+        db.execute(
+            select(Card).where(Card.deck_id.in_(deck_id_by_name.values())).order_by(Card.id)
+        )
+        .scalars()
+        .all()
+    )
 
 # ============== STUDY ENDPOINTS ==============
 
@@ -752,12 +878,16 @@ async def get_study_stats(
 ):
     """Get study statistics for a deck."""
     from app.cards.study_service import StudyService
-    
-    # Verify deck belongs to user
-    deck = db.query(Deck).filter(Deck.id == deck_id, Deck.user_id == current_user.id).first()
-    if not deck:
+
+    # No preflight deck SELECT: every service query filters on
+    # Card.user_id, so a foreign deck simply yields no rows. The id-only
+    # existence check keeps the 404 contract without hydrating the deck.
+    deck_exists = db.execute(
+        select(Deck.id).where(Deck.id == deck_id, Deck.user_id == current_user.id)
+    ).scalar_one_or_none()
+    if deck_exists is None:
         raise HTTPException(status_code=404, detail="Deck not found")
-    
+
     stats = StudyService.get_study_stats(deck_id, current_user.id, db)
     return stats
 
@@ -781,12 +911,9 @@ async def get_next_study_card(
     """
     from app.cards.study_service import StudyService, StudyMode
     from app.cards.models import CardReview
-    
-    # Verify deck belongs to user
-    deck = db.query(Deck).filter(Deck.id == deck_id, Deck.user_id == current_user.id).first()
-    if not deck:
-        raise HTTPException(status_code=404, detail="Deck not found")
-    
+
+    # No separate ownership query: the service filters by Card.user_id,
+    # which implicitly proves ownership (a foreign deck returns no card)
     # Get next card based on mode
     if mode == StudyMode.SPACED_REPETITION:
         card = StudyService.get_next_card_spaced_repetition(deck_id, current_user.id, db, shuffle=shuffle)
@@ -840,10 +967,13 @@ async def submit_study_review(
     - **answer**: User's answer (for quiz/exam modes)
     """
     from app.cards.study_service import StudyService, StudyMode
-    
-    # Verify card belongs to user
-    card = db.query(Card).filter(Card.id == card_id, Card.user_id == current_user.id).first()
-    if not card:
+
+    # submit_review_spaced/fast create CardReview rows keyed only by ids,
+    # so ownership must be proven here - but an id-only select is enough
+    card_exists = db.execute(
+        select(Card.id).where(Card.id == card_id, Card.user_id == current_user.id)
+    ).scalar_one_or_none()
+    if card_exists is None:
         raise HTTPException(status_code=404, detail="Card not found")
     
     # Process based on mode
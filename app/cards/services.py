@@ -1,8 +1,14 @@
+import hashlib
+import io
 import logging
 import asyncio
+import re
+import threading
 from typing import List, Dict, Optional
 from concurrent.futures import ThreadPoolExecutor
 
+import httpx
+from cachetools import TTLCache
 from google import genai
 from google.genai import types
 
@@ -14,12 +20,24 @@ logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
-# Configure Gemini
-client = genai.Client(api_key=settings.GEMINI_API_KEY)
+# Configure Gemini - one client per process with a widened httpx pool so
+# concurrent calls reuse warm TLS connections instead of re-handshaking
+client = genai.Client(
+    api_key=settings.GEMINI_API_KEY,
+    http_options=types.HttpOptions(
+        timeout=120_000,  # ms
+        client_args={
+            "limits": httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        },
+    ),
+)
 
 # Thread pool for running sync Gemini calls
 _executor = ThreadPoolExecutor(max_workers=4)
 
+# Cap in-flight Gemini calls so concurrent uploads don't queue unbounded work
+_gemini_sem = asyncio.Semaphore(4)
+
 
 SYSTEM_PROMPT = """
 You are an automated PDF-to-Markdown extractor. Your job: given a PDF file and its extracted text layer, produce one high-quality, fully self-contained Markdown (.md) file that represents the document content in a clean and structured form. Ignore images, question numbers, and tables
@@ -36,22 +54,68 @@ Use the following formatting rules:
 """
 
 
+# Built once: google-genai validates the config schema on construction,
+# which there is no reason to repeat per request
+_GEN_CONFIG = types.GenerateContentConfig(system_instruction=SYSTEM_PROMPT)
+
+
+# Inline request payloads are capped around 20MB; larger PDFs go through the
+# Files API so they stream to Gemini instead of being base64-inlined
+_INLINE_PDF_LIMIT = 20 * 1024 * 1024
+
+# Documents whose estimated token count fits under this go to Gemini in one
+# request instead of per-chunk calls (window is 1M; keep headroom for the
+# prompt, the estimate error, and the response)
+_SINGLE_CALL_TOKEN_LIMIT = 900_000
+
+# Re-uploads of identical content (same PDF, or overlapping chunks after a
+# re-upload with extra pages) skip Gemini entirely. Keyed by content hash;
+# in-process like the other caches since the app runs as a single worker.
+_pdf_cache: TTLCache = TTLCache(maxsize=64, ttl=24 * 3600)
+_chunk_cache: TTLCache = TTLCache(maxsize=512, ttl=24 * 3600)
+_cache_lock = threading.Lock()
+
+
+# One "question: answer" card per line; both groups are guaranteed
+# non-empty and pre-stripped, so no per-line Python cleanup is needed
+_CARD_RE = re.compile(r"^[ \t]*([^\s:][^:\n]*?)[ \t]*:[ \t]*(\S[^\n]*?)[ \t]*$", re.M)
+
+
+def _strip_fences(text: str) -> str:
+    """Remove a surrounding markdown code fence, if the model added one."""
+    if text.startswith("```"):
+        first_newline = text.find("\n")
+        if first_newline != -1:
+            text = text[first_newline + 1:]
+        text = text.removesuffix("```").removesuffix("\n")
+    return text
+
+
+def _fingerprint(data: bytes) -> str:
+    """Content hash used as cache key for PDFs and PDF chunks."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
 def _query_to_llm_sync(pdf_bytes: bytes, pdf_text: str) -> Optional[str]:
     """
     Synchronous Gemini LLM query (runs in thread pool).
     """
     try:
         logger.info("Querying Gemini LLM...")
+        if len(pdf_bytes) > _INLINE_PDF_LIMIT:
+            pdf_part = client.files.upload(
+                file=io.BytesIO(pdf_bytes),
+                config=types.UploadFileConfig(mime_type='application/pdf'),
+            )
+        else:
+            pdf_part = types.Part.from_bytes(
+                data=pdf_bytes,
+                mime_type='application/pdf',
+            )
         response = client.models.generate_content(
             model="gemini-2.0-flash",
-            config=types.GenerateContentConfig(system_instruction=SYSTEM_PROMPT),
-            contents=[
-                types.Part.from_bytes(
-                    data=pdf_bytes,
-                    mime_type='application/pdf',
-                ),
-                pdf_text
-            ]
+            config=_GEN_CONFIG,
+            contents=[pdf_part, pdf_text]
         )
         logger.info("Received response from Gemini LLM.")
         return response.text
@@ -66,13 +130,24 @@ async def query_to_llm(pdf_bytes: bytes, pdf_text: str, timeout: float = 180.0)
     
     Runs in thread pool with timeout to prevent hanging.
     Returns the response text or None on error/timeout.
+    Responses are cached by content hash so identical chunks are free.
     """
-    loop = asyncio.get_event_loop()
+    chunk_key = _fingerprint(pdf_bytes)
+    with _cache_lock:
+        cached = _chunk_cache.get(chunk_key)
+    if cached is not None:
+        return cached
+
+    loop = asyncio.get_running_loop()
     try:
-        result = await asyncio.wait_for(
-            loop.run_in_executor(_executor, _query_to_llm_sync, pdf_bytes, pdf_text),
-            timeout=timeout
-        )
+        async with _gemini_sem:
+            result = await asyncio.wait_for(
+                loop.run_in_executor(_executor, _query_to_llm_sync, pdf_bytes, pdf_text),
+                timeout=timeout
+            )
+        if result is not None:
+            with _cache_lock:
+                _chunk_cache[chunk_key] = result
         return result
     except asyncio.TimeoutError:
         logger.error(f"Gemini LLM query timed out after {timeout} seconds")
@@ -95,61 +170,79 @@ async def generate_cards_from_pdf(pdf_bytes: bytes, selected_pages: Optional[Lis
     # Filter pages if selection is provided
     if selected_pages is not None:
         from app.pdf.extractor import filter_pdf_pages
-        pdf_bytes = filter_pdf_pages(pdf_bytes, selected_pages)
-
-    # Extract text from PDF
-    text_content_list = extract_text_from_pdf(pdf_bytes, pages_per_chunk=10)
+        pdf_bytes = await asyncio.to_thread(filter_pdf_pages, pdf_bytes, selected_pages)
+
+    # Whole-document cache: identical uploads (same bytes, same page
+    # selection after filtering) return the parsed cards without any LLM work
+    pdf_key = _fingerprint(pdf_bytes)
+    with _cache_lock:
+        cached_cards = _pdf_cache.get(pdf_key)
+    if cached_cards is not None:
+        return [dict(card) for card in cached_cards]
+
+    # Extract text from PDF off the event loop - PyMuPDF holds the thread
+    # in C for the whole document (or, for long ones, while the parent
+    # waits on its worker processes)
+    text_content_list = await asyncio.to_thread(
+        extract_text_from_pdf, pdf_bytes, pages_per_chunk=10
+    )
     logger.info(f"Extracted {len(text_content_list)} text chunks from PDF.")
     
     if not text_content_list:
         return []
-    
-    if len(text_content_list) == 1:
-        logger.info("Single chunk detected, querying LLM...")
-        response = await query_to_llm(pdf_bytes, text_content_list[0])
+
+    # Local token estimate (~4 chars/token for the text layer plus ~258
+    # tokens per PDF page); gemini-2.0-flash takes 1M, so most documents
+    # fit one request and the per-chunk system-prompt overhead is skipped.
+    # Never calls count_tokens - the heuristic only needs to be safe-side.
+    estimated_tokens = (
+        sum(len(text) for text in text_content_list) // 4
+        + 258 * 10 * len(text_content_list)
+    )
+
+    if len(text_content_list) == 1 or estimated_tokens <= _SINGLE_CALL_TOKEN_LIMIT:
+        logger.info(f"~{estimated_tokens} tokens, querying LLM in a single call...")
+        response = await query_to_llm(pdf_bytes, "\n".join(text_content_list))
         if response is None:
             return []
-        if response.startswith("```"):
-            lines = response.split("\n")
-            response = "\n".join(lines[1:-1])
+        response = _strip_fences(response)
     else:
-        logger.info("Multiple chunks detected, querying LLM for each chunk...")
-        chunk_bytes = split_pdf_bytes_to_chunks(pdf_bytes, pages_per_chunk=10)
-        full_response = ""
-        for chunk_byte, chunk_text in zip(chunk_bytes, text_content_list, strict=True):
-            chunk_response = await query_to_llm(chunk_byte, chunk_text)
-            if chunk_response is None:
-                continue
-            
-            if chunk_response.startswith("```"):
-                lines = chunk_response.split("\n")
-                chunk_response = "\n".join(lines[1:-1])
-
-            full_response += chunk_response + "\n"
-        response = full_response
-
-    # Parse response into cards
-    cards = []
-    for line in response.split("\n"):
-        idx = line.find(":")
-        if idx != -1:
-            question, answer = line[:idx], line[idx+1:]
-            question = question.strip()
-            answer = answer.strip()
-            if question and answer:  # Skip empty entries
-                cards.append({
-                    "question": question,
-                    "answer": answer
-                })
-
-    # Validate structure
-    validated_cards = []
-    for card in cards:
-        if isinstance(card, dict) and "question" in card and "answer" in card:
-            validated_cards.append({
-                "question": str(card["question"]),
-                "answer": str(card["answer"])
-            })
-    
+        logger.info(f"~{estimated_tokens} tokens, querying LLM per chunk concurrently...")
+        chunk_bytes = await asyncio.to_thread(
+            split_pdf_bytes_to_chunks, pdf_bytes, pages_per_chunk=10
+        )
+        # Boilerplate-heavy PDFs (TOC, headers, appendix stubs) can repeat
+        # whole chunks; query each distinct text once and fan results back
+        # out to every position
+        keys = [_fingerprint(chunk_text.encode()) for chunk_text in text_content_list]
+        unique_chunks = {}
+        for key, chunk_byte, chunk_text in zip(keys, chunk_bytes, text_content_list, strict=True):
+            unique_chunks.setdefault(key, (chunk_byte, chunk_text))
+        # Fire all chunk queries at once; _gemini_sem inside query_to_llm
+        # caps actual concurrency so we stay under the API rate limits
+        chunk_responses = await asyncio.gather(
+            *(
+                query_to_llm(chunk_byte, chunk_text)
+                for chunk_byte, chunk_text in unique_chunks.values()
+            )
+        )
+        response_by_key = dict(zip(unique_chunks, chunk_responses))
+        response = "\n".join(
+            _strip_fences(response_by_key[key])
+            for key in keys
+            if response_by_key[key] is not None
+        )
+
+    # Parse response into cards with one C-level regex scan; the pattern
+    # already enforces non-empty question and answer, so the old second
+    # validation pass is redundant
+    validated_cards = [
+        {"question": question, "answer": answer}
+        for question, answer in _CARD_RE.findall(response)
+    ]
+
+    if validated_cards:
+        with _cache_lock:
+            _pdf_cache[pdf_key] = validated_cards
     return validated_cards
 
@@ -1,11 +1,40 @@
+import random
+import unicodedata
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy import and_, or_, func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.cards.models import Card, Deck, CardReview
 
 
+def _stamp_first_review(db: Session, card_id: int, now: datetime) -> None:
+    """Record the first-ever review of a card (no-op on later reviews).
+    Keeps Card.first_reviewed_at in sync for the new-card study picker."""
+    db.execute(
+        update(Card)
+        .where(Card.id == card_id, Card.first_reviewed_at.is_(None))
+        .values(first_reviewed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _random_row(query):
+    """Pick one row uniformly via COUNT + OFFSET instead of ORDER BY
+    random(), which sorts every candidate row before returning one."""
+    n = query.count()
+    if not n:
+        return None
+    return query.offset(random.randrange(n)).first()
+
+
+def _normalize_answer(text: str) -> str:
+    """Normalize an answer for quiz comparison. casefold (not lower) so
+    Kazakh/Cyrillic text compares correctly; NFKC folds lookalike forms."""
+    return unicodedata.normalize("NFKC", text).casefold().strip()
+
+
 class StudyMode:
     SPACED_REPETITION = "spaced"
     FAST_REVIEW = "fast"
@@ -28,43 +57,30 @@ class StudyService:
                 "done": count of cards reviewed today
             }
         """
-        # Get all card IDs in the deck
-        card_ids = db.query(Card.id).filter(
-            Card.deck_id == deck_id,
-            Card.user_id == user_id
-        ).all()
-        card_ids = [c[0] for c in card_ids]
-        
-        if not card_ids:
-            return {"new": 0, "to_review": 0, "done": 0}
-        
-        # Count new cards (never reviewed)
-        reviewed_card_ids = db.query(CardReview.card_id).filter(
-            CardReview.card_id.in_(card_ids),
-            CardReview.user_id == user_id
-        ).distinct().all()
-        reviewed_card_ids = [c[0] for c in reviewed_card_ids]
-        
-        new_count = len(card_ids) - len(reviewed_card_ids)
-        
-        # Count cards due for review (due_date <= now)
+        # One aggregation pass: outer-join reviews onto the deck's cards and
+        # count with FILTER clauses, instead of shipping every card id to
+        # Python and sending it back inside three IN (...) queries
         now = datetime.now()
-        to_review_count = db.query(func.count(CardReview.id)).filter(
-            CardReview.card_id.in_(card_ids),
-            CardReview.user_id == user_id,
-            CardReview.due_date <= now
-        ).scalar() or 0
-        
-        # Count cards reviewed today
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        done_count = db.query(func.count(CardReview.id)).filter(
-            CardReview.card_id.in_(card_ids),
-            CardReview.user_id == user_id,
-            CardReview.last_reviewed >= today_start
-        ).scalar() or 0
-        
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        total, reviewed, to_review_count, done_count = (
+            db.query(
+                func.count(func.distinct(Card.id)),
+                func.count(func.distinct(CardReview.card_id)),
+                func.count(CardReview.id).filter(CardReview.due_date <= now),
+                func.count(CardReview.id).filter(CardReview.last_reviewed >= today_start),
+            )
+            .select_from(Card)
+            .outerjoin(
+                CardReview,
+                and_(CardReview.card_id == Card.id, CardReview.user_id == user_id),
+            )
+            .filter(Card.deck_id == deck_id, Card.user_id == user_id)
+            .one()
+        )
+
         return {
-            "new": new_count,
+            "new": total - reviewed,
             "to_review": to_review_count,
             "done": done_count
         }
@@ -86,26 +102,24 @@ class StudyService:
         )
         
         if shuffle:
-            due_review = query.order_by(func.random()).first()
+            due_review = _random_row(query)
         else:
             due_review = query.order_by(CardReview.due_date.asc()).first()
         
         if due_review:
             return due_review.card
         
-        # If no due cards, get a new card (never reviewed)
-        reviewed_card_ids = db.query(CardReview.card_id).filter(
-            CardReview.user_id == user_id
-        ).distinct().subquery()
-        
+        # If no due cards, get a new card. first_reviewed_at is stamped on
+        # the first review submit, so NULL means "new" without anti-joining
+        # the whole card_reviews table
         new_card_query = db.query(Card).filter(
             Card.deck_id == deck_id,
             Card.user_id == user_id,
-            ~Card.id.in_(reviewed_card_ids)
+            Card.first_reviewed_at.is_(None)
         )
         
         if shuffle:
-            new_card = new_card_query.order_by(func.random()).first()
+            new_card = _random_row(new_card_query)
         else:
             new_card = new_card_query.first()
         
@@ -132,7 +146,7 @@ class StudyService:
         )
         
         if shuffle:
-            card = query.order_by(func.random()).first()
+            card = _random_row(query)
         else:
             card = query.first()
         
@@ -154,7 +168,7 @@ class StudyService:
         
         # Get random card
         if shuffle:
-            card = query.order_by(func.random()).first()
+            card = _random_row(query)
         else:
             card = query.first()
         return card
@@ -178,36 +192,38 @@ class StudyService:
         Returns:
             Updated review statistics
         """
-        # Get or create CardReview
-        review = db.query(CardReview).filter(
+        # Scalar fetch of the SM-2 state - no ORM row hydration
+        state = db.query(
+            CardReview.ease_factor, CardReview.interval, CardReview.repetitions
+        ).filter(
             CardReview.card_id == card_id,
             CardReview.user_id == user_id
         ).first()
-        
-        if not review:
-            # First time reviewing this card
-            review = CardReview(
-                card_id=card_id,
-                user_id=user_id,
-                ease_factor=2.5,
-                interval=1,
-                repetitions=0
-            )
-            db.add(review)
-        
-        # Calculate next interval using SM-2
-        new_ease, new_interval, new_reps, new_due = review.calculate_next_interval(quality)
-        
-        # Update review
-        review.ease_factor = new_ease
-        review.interval = new_interval
-        review.repetitions = new_reps
-        review.due_date = new_due
-        review.quality = quality
-        review.last_reviewed = datetime.now()
-        
+        ease, interval, reps = state if state else (2.5, 1, 0)
+
+        # Calculate next interval using SM-2 on a transient instance
+        new_ease, new_interval, new_reps, new_due = CardReview(
+            ease_factor=ease, interval=interval, repetitions=reps
+        ).calculate_next_interval(quality)
+
+        # Single upsert against ux_card_reviews_card_user instead of the old
+        # SELECT + UPDATE/INSERT + refresh sequence
+        now = datetime.now()
+        updated = {
+            "ease_factor": new_ease,
+            "interval": new_interval,
+            "repetitions": new_reps,
+            "due_date": new_due,
+            "quality": quality,
+            "last_reviewed": now,
+        }
+        db.execute(
+            pg_insert(CardReview)
+            .values(card_id=card_id, user_id=user_id, **updated)
+            .on_conflict_do_update(index_elements=["card_id", "user_id"], set_=updated)
+        )
+        _stamp_first_review(db, card_id, now)
         db.commit()
-        db.refresh(review)
         
         return {
             "next_review_in_days": new_interval,
@@ -225,27 +241,27 @@ class StudyService:
         Submit a card review for fast review mode.
         Simply marks as reviewed today.
         """
-        # Get or create CardReview
-        review = db.query(CardReview).filter(
-            CardReview.card_id == card_id,
-            CardReview.user_id == user_id
-        ).first()
-        
-        if not review:
-            review = CardReview(
+        # One upsert: insert with defaults on first review, otherwise only
+        # bump last_reviewed (quality stays whatever it was)
+        now = datetime.now()
+        db.execute(
+            pg_insert(CardReview)
+            .values(
                 card_id=card_id,
                 user_id=user_id,
                 ease_factor=2.5,
                 interval=1,
                 repetitions=0,
-                quality=4  # Default to "OK"
+                quality=4,  # Default to "OK"
+                last_reviewed=now,
             )
-            db.add(review)
-        
-        review.last_reviewed = datetime.now()
-        
+            .on_conflict_do_update(
+                index_elements=["card_id", "user_id"], set_={"last_reviewed": now}
+            )
+        )
+        _stamp_first_review(db, card_id, now)
         db.commit()
-        
+
         return {"reviewed": True}
     
     @staticmethod
@@ -267,28 +283,29 @@ class StudyService:
         if not card:
             return {"error": "Card not found"}
         
-        # Simple text comparison (normalize whitespace and case)
-        correct = card.answer.strip().lower() == user_answer.strip().lower()
-        
-        # Record the review attempt
-        review = db.query(CardReview).filter(
-            CardReview.card_id == card_id,
-            CardReview.user_id == user_id
-        ).first()
+        # Simple text comparison (normalize whitespace, case, and form)
+        correct = _normalize_answer(card.answer) == _normalize_answer(user_answer)
         
-        if not review:
-            review = CardReview(
+        # Record the review attempt with a single upsert
+        now = datetime.now()
+        quality = 5 if correct else 0
+        db.execute(
+            pg_insert(CardReview)
+            .values(
                 card_id=card_id,
                 user_id=user_id,
                 ease_factor=2.5,
                 interval=1,
-                repetitions=0
+                repetitions=0,
+                quality=quality,
+                last_reviewed=now,
             )
-            db.add(review)
-        
-        review.last_reviewed = datetime.now()
-        review.quality = 5 if correct else 0
-        
+            .on_conflict_do_update(
+                index_elements=["card_id", "user_id"],
+                set_={"last_reviewed": now, "quality": quality},
+            )
+        )
+        _stamp_first_review(db, card_id, now)
         db.commit()
         
         return {
@@ -15,12 +15,13 @@ if database_url.startswith("postgresql://"):
 engine = create_engine(
     database_url,
     pool_pre_ping=True,  # Check connection health before using
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,  # Timeout when getting connection from pool (seconds)
-    pool_recycle=300,  # Recycle connections after 5 minutes to prevent stale connections
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,  # Timeout when getting connection from pool (seconds)
+    pool_recycle=settings.DB_POOL_RECYCLE,  # Recycle connections to prevent idle-timeout drops
     connect_args={
         "connect_timeout": "10",  # Connection timeout for psycopg3 (string value in seconds)
+        "prepare_threshold": settings.DB_PREPARE_THRESHOLD,
     }
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -0,0 +1,37 @@
+"""Run every migration script in dependency order.
+
+One command for deploys: python migrate_all.py. This reuses the single
+app engine for one process instead of invoking N scripts (N startups,
+N connection handshakes).
+
+The steps run sequentially, not inside one transaction: the older
+scripts tolerate "already exists" errors on re-runs, and any such error
+inside a single Postgres transaction would abort every later step.
+"""
+
+import migrate_folders
+import migrate_folders_nesting
+import migrate_reviews
+import migrate_card_reviews
+import migrate_indexes
+import migrate_first_reviewed
+
+_STEPS = [
+    migrate_folders,
+    migrate_folders_nesting,
+    migrate_reviews,
+    migrate_card_reviews,
+    migrate_indexes,
+    migrate_first_reviewed,
+]
+
+
+def migrate():
+    for step in _STEPS:
+        print(f"=== {step.__name__} ===")
+        step.migrate()
+    print("All migrations done.")
+
+
+if __name__ == "__main__":
+    migrate()
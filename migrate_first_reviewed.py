@@ -0,0 +1,31 @@
+from sqlalchemy import text
+from app.database import engine
+
+def migrate():
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        print("Starting migration for cards.first_reviewed_at...")
+
+        statements = [
+            "ALTER TABLE cards ADD COLUMN IF NOT EXISTS first_reviewed_at TIMESTAMPTZ;",
+            # Backfill from existing review history so old cards don't all
+            # show up as "new" again
+            """
+            UPDATE cards SET first_reviewed_at = r.first_ts
+            FROM (
+                SELECT card_id, MIN(created_at) AS first_ts
+                FROM card_reviews
+                GROUP BY card_id
+            ) r
+            WHERE cards.id = r.card_id AND cards.first_reviewed_at IS NULL;
+            """,
+        ]
+        for stmt in statements:
+            try:
+                conn.execute(text(stmt))
+                print(f"OK: {stmt.strip().splitlines()[0]}")
+            except Exception as e:
+                print(f"Migration step failed: {e}")
+
+if __name__ == "__main__":
+    migrate()
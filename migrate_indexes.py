@@ -0,0 +1,39 @@
+from sqlalchemy import text
+from app.database import engine
+
+def migrate():
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        print("Starting migration for composite indexes...")
+
+        statements = [
+            "CREATE INDEX IF NOT EXISTS ix_cards_user_deck_created ON cards (user_id, deck_id, created_at);",
+            "CREATE INDEX IF NOT EXISTS ix_cards_user_created ON cards (user_id, created_at);",
+            "CREATE INDEX IF NOT EXISTS ix_decks_user_created ON decks (user_id, created_at);",
+            "CREATE INDEX IF NOT EXISTS ix_cards_deck_created ON cards (deck_id, created_at);",
+            "CREATE INDEX IF NOT EXISTS ix_card_reviews_user_due ON card_reviews (user_id, due_date);",
+            "CREATE INDEX IF NOT EXISTS ix_card_reviews_user_lastrev ON card_reviews (user_id, last_reviewed);",
+        ]
+        for stmt in statements:
+            try:
+                conn.execute(text(stmt))
+                print(f"OK: {stmt}")
+            except Exception as e:
+                print(f"Index creation failed: {e}")
+
+        # The study-submit upserts rely on this unique index existing, so
+        # dedupe first (keep the newest row per (card_id, user_id)) and let
+        # any failure here abort the migration instead of being swallowed
+        print("Deduplicating card_reviews and creating unique index...")
+        conn.execute(text(
+            "DELETE FROM card_reviews a USING card_reviews b "
+            "WHERE a.card_id = b.card_id AND a.user_id = b.user_id AND a.id < b.id;"
+        ))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_card_reviews_card_user "
+            "ON card_reviews (card_id, user_id);"
+        ))
+        print("OK: ux_card_reviews_card_user")
+
+if __name__ == "__main__":
+    migrate()